@@ -0,0 +1,54 @@
+"""
+Measures how long it takes to launch the application. Every case is run in a fresh interpreter, and the best of
+several runs is reported. Run with "python benchmark.py".
+"""
+
+import subprocess
+import sys
+import time
+
+repetitions = 5
+
+setup = "import numpy as np, utils; window = np.random.randn(200, 4); "
+
+cases = [
+    ("python interpreter", "pass"),
+    ("import pyautogui, pylsl, utils (eager imports, as before)", "import pyautogui, pylsl, utils"),
+    ("import main (main.py run / calibrate)", "import main"),
+    ("import utils, pipeline, journal (offline analysis)", "import utils, pipeline, journal"),
+    ("first window, operator not cached",
+     setup + "import tempfile\nwith tempfile.TemporaryDirectory() as directory:\n"
+             "    utils.cache_directory = directory\n    utils.preprocessing(window)"),
+    ("first window, operator cached", setup + "utils.preprocessing(window)"),
+    ("import pyautogui (deferred until the first key press)", "import pyautogui"),
+    ("import pylsl (deferred until connecting to the stream)", "import pylsl"),
+]
+
+
+def measure(code):
+    """
+    Arguments:
+        code (str): Python code to be run in a fresh interpreter
+
+    Returns:
+        float: the shortest time in seconds it took to run the code, or None if the code failed (e.g. because an
+        optional dependency is not installed)
+    """
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        duration = time.perf_counter() - start
+        if result.returncode != 0:
+            return None
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+if __name__ == "__main__":
+    # make sure the operator is cached before measuring the cached case
+    subprocess.run([sys.executable, "-c", setup + "utils.preprocessing(window)"], check=True)
+
+    for name, code in cases:
+        duration = measure(code)
+        print("{:<60}{}".format(name, "not available" if duration is None else "{:.3f} s".format(duration)))
@@ -0,0 +1,192 @@
+import numpy as np
+import threading
+import queue
+import time
+import os
+
+# actions the Analyzer can emit (the index is stored in the "action" field of a record, other actions are stored as 0)
+ACTIONS = ["", "right", "left", "down", "up", "enter", "navigation"]
+
+# fields of a record describing the state of the action stage (see AnalyzerStage.state())
+STATE_FIELDS = ["navigation", "upward signal received", "downward signal received", "potential glance", "u_timer",
+                "d_timer", "d_timer2"]
+
+# layout of a single journal record (one record per analyzed window)
+RECORD = np.dtype([("timestamp", "<f8"),
+                   ("D", "<f8"),
+                   ("DD", "<f8"),
+                   ("navigation", "u1"),
+                   ("upward signal received", "u1"),
+                   ("downward signal received", "u1"),
+                   ("potential glance", "u1"),
+                   ("u_timer", "<i2"),
+                   ("d_timer", "<i2"),
+                   ("d_timer2", "<i2"),
+                   ("drop windows", "<i2"),
+                   ("action", "u1")])
+
+# every journal file starts with this marker
+MAGIC = b"EOGJRNL1"
+
+
+class Journal:
+    """
+    This class is used to write an append-only binary journal of every analyzed window. Records are only put into a
+    queue by log(), so no disk I/O happens in the main loop. A background thread collects the queued records and
+    writes them in batches. A new file is started once the current file exceeds max_bytes or is older than
+    max_seconds. If writing fails (e.g. because the disk is full), the error is reported once and all further records
+    are dropped. Records are also dropped while the queue is full.
+
+    Attributes:
+        directory (str): directory the journal files are written to
+        max_bytes (int): size in bytes after which a new journal file is started
+        max_seconds (float): age in seconds after which a new journal file is started
+        flush_interval (float): time in seconds between two batched writes
+        records (queue.Queue): records waiting to be written
+        failed (bool): is set to True once writing failed
+        dropped (int): number of records that were dropped
+        file (file object): journal file that is currently written to
+        opened (float): time at which the current journal file was opened
+        stopped (threading.Event): is set by close() to make the background thread write the remaining records and stop
+        thread (threading.Thread): background thread writing the records
+    """
+
+    def __init__(self, directory, max_bytes, max_seconds, flush_interval=1.0, max_queued=100000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(maxsize=max_queued)
+        self.failed = False
+        self.dropped = 0
+        self.file = None
+        self.opened = 0
+        self.stopped = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def log(self, timestamp, D, DD, action="", drop_windows=0, state=None):
+        """
+        Queues a record for the current window. State fields missing from state are stored as 0 (e.g. during
+        calibration, where no state is available).
+
+        Arguments:
+            timestamp (float): LSL timestamp of the newest sample in the window
+            D (float): The region under the graph as computed by compute_D()
+            DD (float): The region under the graph as computed by compute_DD()
+            action (str): action emitted for the window (see ACTIONS)
+            drop_windows (int): number of windows to drop as returned by classify_window()
+            state (dict): state of the action stage, keyed by the names in STATE_FIELDS
+        """
+        if self.failed:
+            self.dropped += 1
+            return
+
+        if state is None:
+            state = {}
+        record = (timestamp, D, DD, *[state.get(field, 0) for field in STATE_FIELDS], drop_windows,
+                  ACTIONS.index(action) if action in ACTIONS else 0)
+
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        """
+        Writes the queued records every self.flush_interval seconds until close() is called.
+        """
+        try:
+            while not self.stopped.wait(self.flush_interval):
+                self.flush()
+            self.flush()
+        except Exception as error:
+            # e.g. the disk is full or the directory was removed
+            self.failed = True
+            print("Journal could not be written, further records are dropped: " + str(error))
+
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def flush(self):
+        """
+        Writes all currently queued records as one batch, starting a new journal file if necessary.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+
+        if len(batch) == 0:
+            return
+
+        if self.file is None or self.file.tell() >= self.max_bytes or time.time() - self.opened >= self.max_seconds:
+            self.rotate()
+
+        self.file.write(np.array(batch, dtype=RECORD).tobytes())
+        self.file.flush()
+
+    def rotate(self):
+        """
+        Closes the current journal file and opens a new one, named after the current time.
+        """
+        if self.file is not None:
+            self.file.close()
+
+        self.opened = time.time()
+        name = time.strftime("journal-%Y%m%d-%H%M%S", time.localtime(self.opened))
+        path = os.path.join(self.directory, name + ".bin")
+
+        # avoid overwriting a journal file that was started within the same second
+        index = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, "{}-{}.bin".format(name, index))
+            index += 1
+
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+
+    def close(self):
+        """
+        Writes all remaining records and stops the background thread. Reports how many records were dropped, if any.
+        """
+        self.stopped.set()
+        self.thread.join()
+
+        if self.dropped > 0:
+            print("Journal dropped " + str(self.dropped) + " records")
+
+
+def load(path):
+    """
+    Loads a journal file, or all journal files of a directory in the order they were written, into a structured
+    NumPy array (see RECORD). An incomplete record at the end of a file (e.g. after a crash) is ignored.
+
+    Arguments:
+        path (str): journal file or directory containing journal files
+
+    Returns:
+        np.ndarray: the records, e.g. load("journal")["D"] yields the D time series
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.startswith("journal-")
+                       and name.endswith(".bin"))
+        # sort by modification time, as names alone do not order files started within the same second
+        files.sort(key=os.path.getmtime)
+        return np.concatenate([load(file) for file in files]) if files else np.empty(0, dtype=RECORD)
+
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a journal file")
+
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD.itemsize
+    return np.fromfile(path, dtype=RECORD, count=count, offset=len(MAGIC))
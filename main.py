@@ -1,66 +1,50 @@
-from pylsl import StreamInlet, resolve_byprop
-import numpy as np
+import pipeline
+import journal
+import sharing
+import asyncio
 import utils
-import math
 import json
 import sys
 
-""" User input error handling """
-
-option_1 = (len(sys.argv) == 2) and sys.argv[1] == "run"
-option_2 = (len(sys.argv) == 3) and sys.argv[1] == "calibrate" and sys.argv[2] in ["resting", "right", "left", "upward",
-                                                                                   "downward"]
-if not (option_1 or option_2):
-    print("Pass either \"run\" as argument or \"calibrate <type>\" (<type> is either \"resting\", \"right\", \"left\","
-          " \"upward\" or \"downward\")")
-    exit(1)
-
-""" Load dictionary from config """
-
-parameters = json.load(open("config.json"))
 '''
 config.json contents:
 
 "number of recording phases": number of times data will be recorded in recording phases during calibration
-"window size": number of samples that a window is composed of
-"step size": distance in terms of number of samples that the window will slide further to compose the next window to be 
+"window length": time in seconds that a window covers
+"sampling rate": sampling rate in Hz that the incoming samples are resampled to before composing windows. The defaults
+                 (0.78125 seconds at 256 Hz) yield windows of 200 samples, as used for the Muse headset
+"step size": distance in terms of number of samples that the window will slide further to compose the next window to be
              analyzed
+"shared memory prefix": prefix of the shared memory segments that windows and features are published to (see
+                        sharing.py). Set to "" to disable publishing
+"feature history size": number of (timestamp, D, DD) rows kept in the shared feature ring buffer
+"journal directory": directory the binary journal of every analyzed window is written to (see journal.py). Set to "" to
+                     disable the journal
+"journal max size": size in bytes after which a new journal file is started
+"journal max age": age in seconds after which a new journal file is started
 '''
 
-""" Connect to the EEG stream """
-
-print('Looking for EEG stream...')
-streams = resolve_byprop('type', 'EEG', timeout=2)
 
-if len(streams) == 0:
-    raise RuntimeError('Cannot find EEG stream.')
+def load_analyzer(path="calibration.txt"):
+    """
+    Constructs an Analyzer using the thresholds stored in calibration.txt.
 
-# Construct a stream inlet using the EEG stream
-print("Streaming started")
-inlet = StreamInlet(streams[0])
+    Arguments:
+        path (str): path of the calibration file
 
-""" Start running or calibrating the application """
-
-if sys.argv[1] == "calibrate":
-    # prepare calibration
-    calibrator = utils.Calibrator(parameters["number of recording phases"])
-
-    # determine how many steps to take when sliding the streaming window
-    num_steps = 1
-
-elif sys.argv[1] == "run":
-    file = open(r"calibration.txt", "r")
+    Returns:
+        Analyzer: the Analyzer, or None if not all calibration steps have been performed yet
+    """
+    file = open(path, "r")
     # check if calibration is completed
     if sum(1 for _ in file) < 8:
         file.close()
-        print("You first need to perform all calibration steps")
-        exit(1)
+        return None
 
     # go back to beginning of file
     file.seek(0)
 
     # get thresholds for each direction and construct the Analyzer
-
     thresholds = list(map(lambda x: x.split(":"), [next(file) for i in range(0, 8)]))
     file.close()
 
@@ -69,68 +53,94 @@ elif sys.argv[1] == "run":
     upward = float(thresholds[6][1][:-2])
     downward = float(thresholds[7][1][:-2])
 
-    analyzer = utils.Analyzer(right, left, upward, downward)
+    return utils.Analyzer(right, left, upward, downward)
 
-    # determine how many steps to take initially when sliding the streaming window
-    num_steps = 10
 
-# initialize array
-prev_window = np.zeros((parameters['window size'], 4))
+async def start(argv, parameters):
+    """
+    Runs or calibrates the application, publishing and recording every analyzed window.
 
-while True:
+    Arguments:
+        argv (list): command line arguments
+        parameters (dict): contents of config.json
 
-    # determine how many samples to pull next
-    max_samples = math.floor(num_steps * parameters["window size"] * parameters['step size'])
+    Returns:
+        int: exit code
+    """
+    if argv[1] == "calibrate":
+        # prepare calibration
+        stage = pipeline.CalibratorStage(utils.Calibrator(parameters["number of recording phases"]), argv[2])
 
-    # pull samples
-    new_samples, _ = inlet.pull_chunk(timeout=4, max_samples=max_samples)
+        # determine how many steps to take when sliding the streaming window
+        num_steps = 1
 
-    # append pulled samples to part of the previously analyzed samples
-    window = utils.update_window(prev_window, new_samples)
+    else:
+        analyzer = load_analyzer()
+        if analyzer is None:
+            print("You first need to perform all calibration steps")
+            return 1
+        stage = pipeline.AnalyzerStage(analyzer)
 
-    # save current window for next iteration
-    prev_window = window
+        # determine how many steps to take initially when sliding the streaming window
+        num_steps = 10
 
-    # preprocess window
-    window = utils.preprocessing(window)
+    eog = pipeline.EOGPipeline(pipeline.LSLSource(), stage, parameters["window length"], parameters["step size"],
+                               parameters["sampling rate"], initial_steps=num_steps)
+    await eog.connect()
 
-    # extract features needed for classification
-    D = utils.compute_D(window)
-    DD = utils.compute_DD(window)
+    # publish windows and features to other processes
+    publisher = None
+    if parameters["shared memory prefix"]:
+        publisher = sharing.Publisher(parameters["shared memory prefix"], eog.window_size,
+                                      parameters["feature history size"])
 
-    if sys.argv[1] == "run":
+    # record every analyzed window in a journal
+    recorder = None
+    if parameters["journal directory"]:
+        recorder = journal.Journal(parameters["journal directory"], parameters["journal max size"],
+                                   parameters["journal max age"])
 
-        # detect eye movements and set num_steps to determine when to resume window analysis
-        num_steps = analyzer.classify_window(D, DD) + 1
+    try:
+        async for event in eog:
+            if publisher is not None:
+                publisher.publish_raw(event.raw)
+                publisher.publish_window(event.window)
+                publisher.publish_features(event.timestamp, event.D, event.DD)
 
-    elif sys.argv[1] == "calibrate":
+            if recorder is not None:
+                recorder.log(event.timestamp, event.D, event.DD, event.action, event.drop_windows, event.state)
+    finally:
+        # close the journal even if closing the publisher fails, so its remaining records are written
+        try:
+            if publisher is not None:
+                publisher.close()
+        finally:
+            if recorder is not None:
+                recorder.close()
 
-        if sys.argv[2] == "resting":
+    return 0
 
-            # determine maximum and minimum values for D and DD during resting phases of the eyes
-            if calibrator.calibrate_resting(D, DD) == "finished":
-                exit(0)
 
-        elif sys.argv[2] == "right":
+def main(argv):
+    """ User input error handling """
 
-            # determine threshold for eye movement to the right
-            if calibrator.calibrate_direction(D, DD, "right") == "finished":
-                exit(0)
+    option_1 = (len(argv) == 2) and argv[1] == "run"
+    option_2 = (len(argv) == 3) and argv[1] == "calibrate" and argv[2] in ["resting", "right", "left", "upward",
+                                                                           "downward"]
+    if not (option_1 or option_2):
+        print("Pass either \"run\" as argument or \"calibrate <type>\" (<type> is either \"resting\", \"right\", "
+              "\"left\", \"upward\" or \"downward\")")
+        return 1
 
-        elif sys.argv[2] == "left":
+    """ Load dictionary from config """
 
-            # determine threshold for eye movement to the left
-            if calibrator.calibrate_direction(D, DD, "left") == "finished":
-                exit(0)
+    with open("config.json") as file:
+        parameters = json.load(file)
 
-        elif sys.argv[2] == "upward":
+    """ Start running or calibrating the application """
 
-            # determine threshold for upward eye movement
-            if calibrator.calibrate_direction(D, DD, "upward") == "finished":
-                exit(0)
+    return asyncio.run(start(argv, parameters))
 
-        elif sys.argv[2] == "downward":
 
-            # determine threshold for downward eye movement
-            if calibrator.calibrate_direction(D, DD, "downward") == "finished":
-                exit(0)
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
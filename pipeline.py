@@ -0,0 +1,280 @@
+from collections import namedtuple
+import numpy as np
+import asyncio
+import utils
+import math
+
+# result of analyzing a single window
+#   timestamp (float): LSL timestamp of the newest sample in the window (nan if no samples were pulled)
+#   D (float), DD (float): features as computed by compute_D() and compute_DD()
+#   action (str): action emitted by the stage ("" if none)
+#   drop_windows (int): number of windows dropped before the next window is analyzed
+#   finished (bool): True if the stage is done (e.g. a calibration phase was completed)
+#   state (dict): state of the stage after analyzing the window (see the state() method of the stages)
+#   raw (np.ndarray): the raw window
+#   window (np.ndarray): the preprocessed window
+Event = namedtuple("Event", ["timestamp", "D", "DD", "action", "drop_windows", "finished", "state", "raw", "window"])
+
+
+class LSLSource:
+    """
+    Source stage pulling samples from an LSL stream.
+
+    Attributes:
+        stream_type (str): type of the LSL stream to connect to
+        timeout (float): time in seconds to wait for the stream to be found
+        inlet (StreamInlet): inlet of the stream, created by connect()
+    """
+
+    def __init__(self, stream_type="EEG", timeout=2):
+        self.stream_type = stream_type
+        self.timeout = timeout
+        self.inlet = None
+
+    def connect(self):
+        """
+        Resolves the stream and constructs an inlet for it. pylsl is only imported here, so that the pipeline can be
+        used with other sources without loading liblsl.
+        """
+        from pylsl import StreamInlet, resolve_byprop
+
+        print("Looking for " + self.stream_type + " stream...")
+        streams = resolve_byprop('type', self.stream_type, timeout=self.timeout)
+
+        if len(streams) == 0:
+            raise RuntimeError("Cannot find " + self.stream_type + " stream.")
+
+        print("Streaming started")
+        self.inlet = StreamInlet(streams[0])
+
+    def pull(self, max_samples):
+        """
+        Arguments:
+            max_samples (int): maximum number of samples to pull
+
+        Returns:
+            list: the pulled samples
+            list: the timestamps of the pulled samples
+        """
+        return self.inlet.pull_chunk(timeout=4, max_samples=max_samples)
+
+    def sampling_rate(self):
+        """
+        Returns:
+            float: nominal sampling rate of the stream in Hz
+        """
+        return self.inlet.info().nominal_srate()
+
+
+def extract_features(window):
+    """
+    Default feature stage: preprocesses the window and computes D and DD.
+
+    Arguments:
+        window (np.ndarray): The raw window
+
+    Returns:
+        np.ndarray: The preprocessed window
+        float: D as computed by compute_D()
+        float: DD as computed by compute_DD()
+    """
+    window = utils.preprocessing(window)
+    return window, utils.compute_D(window), utils.compute_DD(window)
+
+
+class AnalyzerStage:
+    """
+    Action stage detecting eye movements and performing the respective commands (see Analyzer).
+
+    Attributes:
+        analyzer (Analyzer): the Analyzer used to classify windows
+    """
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    def step(self, D, DD):
+        """
+        Arguments:
+            D (float): The region under the graph as computed by compute_D()
+            DD (float): The region under the graph as computed by compute_DD()
+
+        Returns:
+            int: number of windows to drop
+            str: action emitted by the Analyzer
+            bool: always False, as the Analyzer keeps running
+        """
+        drop_windows = self.analyzer.classify_window(D, DD)
+        return drop_windows, self.analyzer.action, False
+
+    def state(self):
+        """
+        Returns:
+            dict: the state of the Analyzer (see journal.STATE_FIELDS)
+        """
+        return {"navigation": self.analyzer.navigation,
+                "upward signal received": self.analyzer.u_dict["upward signal received"],
+                "downward signal received": self.analyzer.d_dict["downward signal received"],
+                "potential glance": self.analyzer.d_dict["potential glance"],
+                "u_timer": self.analyzer.u_dict["timer"],
+                "d_timer": self.analyzer.d_dict["timer"],
+                "d_timer2": self.analyzer.d_dict["timer2"]}
+
+
+class CalibratorStage:
+    """
+    Action stage performing one calibration phase (see Calibrator).
+
+    Attributes:
+        calibrator (Calibrator): the Calibrator used to calibrate the classifier
+        phase (str): either "resting", "right", "left", "upward" or "downward"
+    """
+
+    def __init__(self, calibrator, phase):
+        self.calibrator = calibrator
+        self.phase = phase
+
+    def step(self, D, DD):
+        """
+        Arguments:
+            D (float): The region under the graph as computed by compute_D()
+            DD (float): The region under the graph as computed by compute_DD()
+
+        Returns:
+            int: always 0, as no windows are dropped during calibration
+            str: always "", as no actions are emitted during calibration
+            bool: True once the calibration phase is completed
+        """
+        if self.phase == "resting":
+            status = self.calibrator.calibrate_resting(D, DD)
+        else:
+            status = self.calibrator.calibrate_direction(D, DD, self.phase)
+        return 0, "", status == "finished"
+
+    def state(self):
+        """
+        Returns:
+            dict: always empty, as the Calibrator has no state worth recording
+        """
+        return {}
+
+
+class EOGPipeline:
+    """
+    This class slides a window over the samples of a source, extracts features from every window and passes them to an
+    action stage. Blocking work (pulling samples, preprocessing, key presses and beeps) runs in an executor, so the
+    pipeline can be consumed from an asyncio event loop next to other work:
+
+        async for event in EOGPipeline(LSLSource(), AnalyzerStage(analyzer), 0.78125, 0.1, 256, initial_steps=10):
+            ...
+
+    Windows are defined in seconds. Samples are resampled to sampling_rate before they are appended to the window, so
+    the number of samples per window, and thus the cost of analyzing it, is the same for every device.
+
+    Attributes:
+        source: source stage, providing connect(), pull(max_samples) and sampling_rate() (see LSLSource)
+        stage: action stage, providing step(D, DD) and state() (see AnalyzerStage and CalibratorStage)
+        window_length (float): time in seconds that a window covers
+        step_size (float): fraction of the window size that the window slides further to compose the next window
+        sampling_rate (float): sampling rate in Hz that the samples are resampled to
+        resampler (Resampler): resampling stage, created by configure()
+        window_size (int): number of (resampled) samples that a window is composed of
+        num_steps (int): number of steps to take when sliding the window next
+        features (callable): feature stage, mapping a raw window to (preprocessed window, D, DD)
+        prev_window (np.ndarray): the most recent raw window
+        running (bool): is set to False by stop() to end the iteration
+    """
+
+    def __init__(self, source, stage, window_length, step_size, sampling_rate, initial_steps=1,
+                 features=extract_features):
+        self.source = source
+        self.stage = stage
+        self.window_length = window_length
+        self.step_size = step_size
+        self.sampling_rate = sampling_rate
+        self.num_steps = initial_steps
+        self.features = features
+        self.resampler = None
+        self.window_size = round(window_length * sampling_rate)
+        self.prev_window = None
+        self.running = False
+
+    def __aiter__(self):
+        return self.events()
+
+    async def connect(self):
+        """
+        Connects to the source and configures the pipeline for its sampling rate.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.source.connect)
+        self.configure(self.source.sampling_rate())
+
+    def configure(self, source_rate):
+        """
+        Sets up resampling from the given sampling rate of the source to self.sampling_rate.
+
+        Arguments:
+            source_rate (float): sampling rate of the source in Hz (0 for streams without a regular sampling rate)
+        """
+        if source_rate <= 0:
+            source_rate = self.sampling_rate
+
+        self.resampler = utils.Resampler(source_rate, self.sampling_rate)
+        self.prev_window = np.zeros((self.window_size, 4))
+
+    async def events(self):
+        """
+        Connects to the source (unless connect() was awaited before) and yields an Event for every analyzed window,
+        until the stage is finished or stop() is called.
+        """
+        loop = asyncio.get_running_loop()
+        if self.resampler is None:
+            await self.connect()
+
+        self.running = True
+        while self.running:
+
+            # determine how many samples to pull next (at the sampling rate of the source)
+            max_samples = math.floor(self.num_steps * self.window_size * self.step_size * self.resampler.down
+                                     / self.resampler.up)
+
+            new_samples, timestamps = await loop.run_in_executor(None, self.source.pull, max_samples)
+            event = await loop.run_in_executor(None, self.process, new_samples, timestamps)
+            yield event
+
+            if event.finished:
+                break
+
+    def process(self, new_samples, timestamps):
+        """
+        Appends new samples to the window and analyzes the resulting window. This is the synchronous core of events()
+        and can be used directly after configure(), e.g. to replay recorded samples.
+
+        Arguments:
+            new_samples (list): samples pulled from the source
+            timestamps (list): timestamps of the pulled samples
+
+        Returns:
+            Event: the result of analyzing the window
+        """
+        new_samples, timestamps = self.resampler.resample(new_samples, timestamps)
+
+        # append pulled samples to part of the previously analyzed samples
+        raw = utils.update_window(self.prev_window, new_samples)
+        self.prev_window = raw
+
+        window, D, DD = self.features(raw)
+
+        # detect eye movements and set num_steps to determine when to resume window analysis
+        drop_windows, action, finished = self.stage.step(D, DD)
+        self.num_steps = drop_windows + 1
+
+        timestamp = timestamps[-1] if len(timestamps) > 0 else np.nan
+        return Event(timestamp, D, DD, action, drop_windows, finished, self.stage.state(), raw, window)
+
+    def stop(self):
+        """
+        Ends the iteration of events() after the current window.
+        """
+        self.running = False
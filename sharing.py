@@ -0,0 +1,313 @@
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import time
+import sys
+import os
+
+# every segment starts with a small header of int64 values:
+# [sequence counter, number of writes so far, number of rows, number of columns, process id of the creator]
+HEADER_FIELDS = 5
+
+# names of the segments created by this process (see SharedArray.attach())
+created = set()
+
+
+class SharedArray:
+    """
+    This class wraps a 2D float64 NumPy array that lives in a named shared memory segment, so that other processes
+    (e.g. a live visualizer or a logger) can read the data produced by main.py without opening their own LSL inlet.
+
+    Consistency is guaranteed by a sequence counter (seqlock): the writer increments the counter before and after
+    every write, so it is odd while a write is in progress. A reader remembers the counter before reading and checks
+    afterwards that it did not change; if it did, the read is repeated.
+
+    The counter and the data are accessed through plain NumPy loads and stores without memory barriers. This relies on
+    the strong memory ordering of x86 processors; on weakly ordered processors such as ARM (e.g. a Raspberry Pi), a
+    reader may in rare cases accept a torn snapshot.
+
+    Attributes:
+        shm (shared_memory.SharedMemory): the underlying shared memory segment
+        header (np.ndarray): view on the header of the segment (see HEADER_FIELDS)
+        array (np.ndarray): view on the data of the segment
+        owner (bool): is set to True in the process that created the segment and is responsible for unlinking it
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        shape = (int(self.header[2]), int(self.header[3]))
+        if shm.size < (HEADER_FIELDS + shape[0] * shape[1]) * 8:
+            # e.g. a segment written by an older version with a different header
+            shape = (0, 0)
+        self.array = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=HEADER_FIELDS * 8)
+
+    @classmethod
+    def create(cls, name, shape):
+        """
+        Creates a new shared memory segment holding an array of the given shape. A stale segment with the same name
+        (left behind by a run that did not exit cleanly) is replaced. If the process that created a segment with the
+        same name is still running, FileExistsError is raised.
+
+        Arguments:
+            name (str): name of the shared memory segment
+            shape (tuple): number of rows and columns of the array
+
+        Returns:
+            SharedArray: the writable shared array
+        """
+        size = (HEADER_FIELDS + shape[0] * shape[1]) * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = cls.attach(name)
+            pid = int(existing.header[4])
+            existing.close()
+            if is_running(pid):
+                raise FileExistsError("Shared memory segment " + name + " is in use by process " + str(pid) + ". "
+                                      "Stop that process or choose another \"shared memory prefix\" in config.json")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [0, 0, shape[0], shape[1], os.getpid()]
+        created.add(name)
+        shared = cls(shm, owner=True)
+        shared.array[:] = 0
+        return shared
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to an existing shared memory segment created by another process. The shape of the array is read from
+        the header of the segment.
+
+        Arguments:
+            name (str): name of the shared memory segment
+
+        Returns:
+            SharedArray: the shared array (only meant to be read)
+        """
+        if sys.version_info >= (3, 13):
+            # do not let the resource tracker unlink the segment when the reading process exits
+            return cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix" and name not in created:
+            # prevent the resource tracker from unlinking the segment when the reading process exits. Segments created
+            # by this process stay registered, as the creating SharedArray unregisters them when unlinking
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def write(self, data):
+        """
+        Overwrites the whole array with data.
+
+        Arguments:
+            data (np.ndarray): array of the same shape as self.array
+        """
+        self.header[0] += 1
+        self.array[:] = data
+        self.header[1] += 1
+        self.header[0] += 1
+
+    def append(self, row):
+        """
+        Writes a single row into the array, treating it as a ring buffer. self.header[1] counts the number of rows
+        written so far, so readers can determine where the oldest row is stored.
+
+        Arguments:
+            row (array_like): values of the row to be written
+        """
+        self.header[0] += 1
+        self.array[self.header[1] % self.array.shape[0]] = row
+        self.header[1] += 1
+        self.header[0] += 1
+
+    def begin_read(self, timeout=1.0):
+        """
+        Waits until no write is in progress and returns the current sequence counter. Together with validate() this
+        allows reading self.array in place without copying it.
+
+        Arguments:
+            timeout (float): time in seconds after which waiting is given up (e.g. because the writing process died
+                             in the middle of a write)
+
+        Returns:
+            int: the sequence counter to be passed to validate()
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(self.header[0])
+            if seq % 2 == 0:
+                return seq
+            if time.monotonic() > deadline:
+                raise TimeoutError("Shared memory segment " + self.shm.name + " is stuck in the middle of a write")
+            # let the writer finish its write
+            time.sleep(0.0001)
+
+    def validate(self, seq):
+        """
+        Checks whether the array was left untouched since begin_read() returned seq.
+
+        Arguments:
+            seq (int): sequence counter returned by begin_read()
+
+        Returns:
+            bool: True if everything read in between is a consistent snapshot
+        """
+        return int(self.header[0]) == seq
+
+    def read(self, out=None, timeout=1.0):
+        """
+        Copies a consistent snapshot of the array into out.
+
+        Arguments:
+            out (np.ndarray): preallocated array of the same shape as self.array. If None, a new array is allocated
+            timeout (float): time in seconds after which waiting for a write to finish is given up (see begin_read())
+
+        Returns:
+            np.ndarray: the snapshot
+            int: number of writes (for ring buffers: number of rows) performed so far
+        """
+        if out is None:
+            out = np.empty(self.array.shape)
+
+        while True:
+            seq = self.begin_read(timeout)
+            np.copyto(out, self.array)
+            count = int(self.header[1])
+            if self.validate(seq):
+                return out, count
+
+    def read_ring(self):
+        """
+        Returns a consistent snapshot of a ring buffer filled by append(), ordered from the oldest to the newest row.
+
+        Returns:
+            np.ndarray: the rows written so far (at most self.array.shape[0] rows)
+        """
+        snapshot, count = self.read()
+        capacity = snapshot.shape[0]
+        if count < capacity:
+            return snapshot[:count]
+        return np.roll(snapshot, -(count % capacity), axis=0)
+
+    def close(self):
+        """
+        Detaches from the shared memory segment. The process that created the segment also unlinks it, unless it was
+        already unlinked.
+        """
+        self.header = None
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            created.discard(self.shm.name)
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                if os.name == "posix" and sys.version_info < (3, 13):
+                    # unlink() only unregisters the segment from the resource tracker if unlinking succeeded
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+
+
+class Publisher:
+    """
+    This class publishes the data computed by main.py through shared memory segments, so that several consumers can
+    read it without repeating the filtering. The following segments are created:
+
+        -"<prefix>_raw": the raw window (window size x 4) that is appended to by update_window()
+        -"<prefix>_window": the preprocessed window (window size x 4)
+        -"<prefix>_features": ring buffer of (timestamp, D, DD) rows, one per analyzed window
+
+    Attributes:
+        raw (SharedArray): segment holding the raw window
+        window (SharedArray): segment holding the preprocessed window
+        features (SharedArray): segment holding the D/DD time series
+    """
+
+    def __init__(self, prefix, window_size, history_size):
+        self.raw = SharedArray.create(prefix + "_raw", (window_size, 4))
+        try:
+            self.window = SharedArray.create(prefix + "_window", (window_size, 4))
+            try:
+                self.features = SharedArray.create(prefix + "_features", (history_size, 3))
+            except BaseException:
+                self.window.close()
+                raise
+        except BaseException:
+            self.raw.close()
+            raise
+
+    def publish_raw(self, window):
+        """
+        Arguments:
+            window (np.ndarray): the raw window
+        """
+        self.raw.write(window)
+
+    def publish_window(self, window):
+        """
+        Arguments:
+            window (np.ndarray): the preprocessed window
+        """
+        self.window.write(window)
+
+    def publish_features(self, timestamp, D, DD):
+        """
+        Arguments:
+            timestamp (float): LSL timestamp of the newest sample in the window
+            D (float): The region under the graph as computed by compute_D()
+            DD (float): The region under the graph as computed by compute_DD()
+        """
+        self.features.append((timestamp, D, DD))
+
+    def close(self):
+        """
+        Detaches from and unlinks all segments, even if closing one of them fails.
+        """
+        try:
+            self.raw.close()
+        finally:
+            try:
+                self.window.close()
+            finally:
+                self.features.close()
+
+
+def is_running(pid):
+    """
+    Arguments:
+        pid (int): process id
+
+    Returns:
+        bool: True if a process with the given id is running
+    """
+    if pid <= 0:
+        return False
+    if os.name != "posix":
+        # segments disappear on other platforms once no process uses them, so an existing segment is always in use
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def attach(prefix):
+    """
+    Attaches to the segments published by a running instance of main.py.
+
+    Arguments:
+        prefix (str): value of "shared memory prefix" in config.json
+
+    Returns:
+        dict: maps "raw", "window" and "features" to the respective SharedArray
+    """
+    return {key: SharedArray.attach(prefix + "_" + key) for key in ["raw", "window", "features"]}
@@ -1,5 +1,6 @@
+from fractions import Fraction
 import numpy as np
-import pyautogui
+import tempfile
 import os
 
 # define audio feedback
@@ -9,6 +10,28 @@ duration_2 = 0.6  # seconds
 frequency_2 = 640  # hertz
 frequency_3 = 800  # hertz
 
+# directory that precomputed operators are cached in
+cache_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+# version of the way operators are computed, part of the names of cached files so that files computed differently
+# by older versions are not reused
+operator_version = 1
+
+# operators that have already been loaded by this process
+operators = {}
+
+
+def press(key):
+    """
+    Makes the operating system perform a key press. pyautogui initializes the display backend when it is imported, so
+    it is only imported once the first key is pressed (and not at all during calibration or offline analysis).
+
+    Arguments:
+        key (str): the key to be pressed
+    """
+    import pyautogui
+    pyautogui.press(key)
+
 
 class Analyzer:
     """
@@ -22,6 +45,7 @@ class Analyzer:
         downward (float): threshold used to detect downward eye movements
         u_dict (dict): is used to identify whether an upward eye movement or eye closure is performed
         d_dict (dict): is used to identify whether eyes are maintained at a downward position
+        action (str): action emitted while classifying the most recent window ("" if none, see journal.ACTIONS)
     """
 
     def __init__(self, right, left, upward, downward):
@@ -33,6 +57,7 @@ class Analyzer:
         self.downward = downward
         self.u_dict = {"upward signal received": False, "timer": 0}
         self.d_dict = {"downward signal received": False, "timer": 0, "potential glance": False, "timer2": 0}
+        self.action = ""
 
     def classify_window(self, D, DD):
         """
@@ -77,6 +102,7 @@ class Analyzer:
         """
 
         drop_windows = 0
+        self.action = ""
 
         # check if navigation mode is True
         if self.navigation:
@@ -88,8 +114,9 @@ class Analyzer:
             # check if right eye movement is performed
             elif D > self.right:
                 print("right")
+                self.action = "right"
                 # press "right" key
-                pyautogui.press("right")
+                press("right")
                 # play beep
                 os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
                 drop_windows = 20
@@ -97,14 +124,16 @@ class Analyzer:
             # check if left eye movement is performed
             elif D < self.left:
                 print("left")
-                pyautogui.press("left")
+                self.action = "left"
+                press("left")
                 os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
                 drop_windows = 20
 
             # check if downward eye movement is performed
             elif DD < self.downward:
                 print("down")
-                pyautogui.press("down")
+                self.action = "down"
+                press("down")
                 os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
                 drop_windows = 20
 
@@ -159,8 +188,9 @@ class Analyzer:
 
         # check if user glanced upward
         if DD > self.upward * 0.5:
-            pyautogui.press("up")
+            press("up")
             print("up")
+            self.action = "up"
             os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
             self.u_dict["upward signal received"] = False
             drop_windows = 20
@@ -172,8 +202,9 @@ class Analyzer:
         else:
             # user maintains eyes closed
 
-            pyautogui.press("enter")
+            press("enter")
             print("enter")
+            self.action = "enter"
             os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
 
             # switch state of navigation mode
@@ -249,6 +280,7 @@ class Analyzer:
                 # switch state of navigation mode
                 self.navigation = True
                 print("navigation mode is now active")
+                self.action = "navigation"
 
                 self.d_dict["downward signal received"] = False
                 os.system('play -nq -t alsa synth {} sine {}'.format(duration_2, frequency_1))
@@ -529,13 +561,69 @@ class Calibrator:
         return "running"
 
 
-def preprocessing(window):
+def smoothing_operator(window_size, degree):
+    """
+    Returns the matrix that maps a window onto its least-squares polynomial approximation of the given degree (the
+    same result as applying np.polyfit and np.polyval to every channel). The matrix only depends on the window size and
+    the degree, so it is computed once and cached in cache_directory. The cached file is memory-mapped, so later
+    launches neither recompute nor copy it. A cached file that cannot be loaded or has the wrong shape is replaced. If
+    cache_directory is not writable, the operator is computed on every launch instead.
+
+    Arguments:
+        window_size (int): number of samples that a window is composed of
+        degree (int): degree of the polynomial
+
+    Returns:
+        np.ndarray: array of shape (window_size, window_size)
+    """
+    key = ("smoothing", window_size, degree)
+    if key in operators:
+        return operators[key]
+
+    path = os.path.join(cache_directory, "smoothing-v{}-{}-{}.npy".format(operator_version, window_size, degree))
+    try:
+        operator = np.load(path, mmap_mode="r")
+        if operator.shape != (window_size, window_size):
+            operator = None
+    except (OSError, ValueError, EOFError):
+        # the file does not exist yet, or it is empty or damaged (e.g. writing it was interrupted)
+        operator = None
+
+    if operator is None:
+        # projection onto the polynomials of the given degree, computed from an orthonormal basis (QR decomposition
+        # of a Legendre-Vandermonde matrix) as plain powers of the sample indices are badly conditioned
+        vandermonde = np.polynomial.legendre.legvander(np.linspace(-1, 1, window_size), degree)
+        q, _ = np.linalg.qr(vandermonde)
+        operator = q @ q.T
+
+        # write to a temporary file first, so other processes never load a partially written operator. If the cache
+        # cannot be written (e.g. the directory is read-only), the operator is only kept in memory
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            file = tempfile.NamedTemporaryFile(dir=cache_directory, suffix=".npy", delete=False)
+            try:
+                np.save(file, operator)
+                file.close()
+                os.replace(file.name, path)
+            except OSError:
+                file.close()
+                os.remove(file.name)
+                raise
+        except OSError:
+            pass
+
+    operators[key] = operator
+    return operator
+
+
+def preprocessing(window, degree=10):
     """
     Preprocesses window by removing artifacts. First the baseline is removed and then least-squares polynomial
     approximation used to smooth the signal
 
     Arguments:
         window (np.ndarray): The window to be preprocessed
+        degree (int): degree of the polynomial used for least-squares polynomial approximation
 
     Returns:
         np.ndarray: The preprocessed window
@@ -545,13 +633,8 @@ def preprocessing(window):
     means = np.mean(window, axis=0)
     window = np.subtract(window, means)
 
-    # least-squares polynomial approximation with a degree of 10
-    arr = np.empty((window.shape[0], 0))
-    for i in range(0, 4):
-        coefficients = np.polyfit(range(window.shape[0]), window[:, i], 10)
-        fitted_data = np.polyval(coefficients, range(window.shape[0]))
-        arr = np.column_stack((arr, fitted_data))
-    window = arr
+    # least-squares polynomial approximation
+    window = smoothing_operator(window.shape[0], degree) @ window
 
     return window
 
@@ -622,3 +705,92 @@ def update_window(window_1, window_2):
     next_window = np.append(window_1[start:, :], window_2, axis=0)
 
     return next_window
+
+
+class Resampler:
+    """
+    This class is used to convert the incoming samples to a fixed sampling rate before they are appended to the window.
+    The rate is changed by the rational factor up / down: conceptually, up - 1 zeros are inserted after every sample,
+    the result is low-pass filtered (windowed-sinc FIR filter) to prevent aliasing and imaging, and every down-th
+    sample is kept. The filter is split into up polyphase subfilters, so only the kept outputs are computed and the
+    inserted zeros are never multiplied. The last samples of each chunk and the position of the next output are kept,
+    so that chunks of any size can be passed in one after another.
+
+    If the source already delivers the target rate (up == down == 1), the samples are passed through unfiltered, as
+    there is nothing to alias.
+
+    Attributes:
+        up (int): interpolation factor
+        down (int): decimation factor
+        source_rate (float): sampling rate of the incoming samples in Hz
+        phases (np.ndarray): polyphase subfilters, one row per phase, with the taps in reversed order
+        delay (float): group delay of the filter in input samples, subtracted from the output timestamps
+        state (np.ndarray): the last phases.shape[1] - 1 input samples of the previous chunk
+        inputs (int): number of input samples received so far
+        outputs (int): number of output samples produced so far
+    """
+
+    def __init__(self, source_rate, target_rate, num_channels=4, taps_per_phase=10, max_factor=1000):
+        ratio = Fraction(target_rate / source_rate).limit_denominator(max_factor)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.source_rate = source_rate
+        self.inputs = 0
+        self.outputs = 0
+
+        # windowed-sinc low-pass filter with its cutoff at 80% of the lower of both Nyquist frequencies, scaled by up
+        # to make up for the inserted zeros
+        rate_factor = max(self.up, self.down)
+        num_taps = taps_per_phase * rate_factor + 1
+        n = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = np.sinc(0.8 * n / rate_factor) * np.hamming(num_taps)
+        taps = taps / np.sum(taps) * self.up
+        self.delay = (num_taps - 1) / 2 / self.up
+
+        # subfilter p holds the taps p, p + up, p + 2 * up, ...
+        taps_per_subfilter = -(-num_taps // self.up)
+        taps = np.append(taps, np.zeros(taps_per_subfilter * self.up - num_taps))
+        self.phases = taps.reshape(taps_per_subfilter, self.up).T[:, ::-1]
+
+        self.state = np.zeros((taps_per_subfilter - 1, num_channels))
+
+    def resample(self, samples, timestamps):
+        """
+        Resamples a chunk of samples.
+
+        Arguments:
+            samples (list): samples pulled from the stream (the first num_channels channels are used)
+            timestamps (list): timestamps of the samples
+
+        Returns:
+            np.ndarray: the resampled samples
+            np.ndarray: the timestamps of the resampled samples, corrected for the delay of the filter
+        """
+        if len(samples) == 0:
+            return np.empty((0, self.state.shape[1])), np.empty(0)
+
+        samples = np.asarray(samples)[:, :self.state.shape[1]]
+        if self.up == self.down == 1:
+            return samples, np.asarray(timestamps)
+
+        extended = np.concatenate((self.state, samples))
+        self.state = extended[len(extended) - self.state.shape[0]:]
+
+        # positions (in upsampled samples) of all outputs that only depend on samples received so far
+        end = (self.inputs + len(samples)) * self.up
+        positions = np.arange(self.outputs, -(-end // self.down)) * self.down
+        newest = positions // self.up
+        phase = positions % self.up
+
+        # row k of windows holds the input samples output k depends on, ending with its newest input sample
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.phases.shape[1], axis=0)
+        resampled = np.einsum("kct,kt->kc", windows[newest - self.inputs], self.phases[phase])
+
+        # the output is delayed by self.delay input samples with respect to the input
+        offset = phase / self.up - self.delay
+        resampled_timestamps = np.asarray(timestamps)[newest - self.inputs] + offset / self.source_rate
+
+        self.inputs += len(samples)
+        self.outputs += len(positions)
+
+        return resampled, resampled_timestamps